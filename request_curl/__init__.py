@@ -1,4 +1,6 @@
 from .sessions import Session
+from .proxies import Proxy, ProxyPool
+from .coalesce import RequestCoalescer
 from .defaults import (
     CHROME_UA,
     CHROME_HEADERS,
@@ -0,0 +1,137 @@
+import mmap
+import tempfile
+from io import BytesIO
+from typing import BinaryIO, Optional, Union
+
+DEFAULT_SPOOL_SIZE: int = 8 * 1024 * 1024
+
+
+class BodyBuffer:
+    """Response body sink for ``WRITEFUNCTION``.
+
+    The body is kept in memory until it grows beyond ``spool_size`` bytes and
+    is then moved to an anonymous temporary file. With ``max_size`` set, the
+    write callback refuses further data once the limit is crossed, which makes
+    libcurl abort the transfer.
+    """
+
+    def __init__(
+        self, spool_size: int = DEFAULT_SPOOL_SIZE, max_size: Optional[int] = None
+    ):
+        self._spool_size: int = spool_size
+        self._max_size: Optional[int] = max_size
+        self._file: Union[BytesIO, BinaryIO] = BytesIO()
+        self._mmap: Optional[mmap.mmap] = None
+        self._size: int = 0
+        self._spilled: bool = False
+        self.exceeded: bool = False
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def spilled(self) -> bool:
+        return self._spilled
+
+    def write(self, chunk: bytes) -> Optional[int]:
+        if self._max_size is not None and self._size + len(chunk) > self._max_size:
+            self.exceeded = True
+            return 0
+
+        if not self._spilled and self._size + len(chunk) > self._spool_size:
+            self.__spill()
+
+        self._file.write(chunk)
+        self._size += len(chunk)
+        return None
+
+    def getbuffer(self) -> memoryview:
+        """Returns a read-only view of the body without copying it."""
+        if not self._spilled:
+            view = self._file.getbuffer()
+            # memoryview.toreadonly is only available from Python 3.8 on
+            return view.toreadonly() if hasattr(view, "toreadonly") else view
+
+        if not self._size:
+            return memoryview(b"")
+
+        if self._mmap is None:
+            self._file.flush()
+            self._mmap = mmap.mmap(
+                self._file.fileno(), self._size, access=mmap.ACCESS_READ
+            )
+        return memoryview(self._mmap)
+
+    def getvalue(self) -> bytes:
+        if not self._spilled:
+            return self._file.getvalue()
+        return self.getbuffer().tobytes()
+
+    def freeze(self) -> "FrozenBody":
+        """Hands the body over to an immutable :class:`FrozenBody` and closes
+        the buffer.
+
+        A spilled body is not read back into memory, the frozen body shares
+        its read-only memory map instead.
+        """
+        if self._spilled:
+            frozen = FrozenBody(self.getbuffer())
+            # the map now belongs to the view and is unmapped together with
+            # the last response using it
+            self._mmap = None
+        else:
+            frozen = FrozenBody(self._file.getvalue())
+        self.close()
+        return frozen
+
+    def close(self) -> None:
+        try:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.close()
+        except BufferError:
+            # a view handed out earlier still references the body, it is
+            # released together with the last reference to this buffer
+            pass
+
+    def __spill(self) -> None:
+        spill_file = tempfile.TemporaryFile()
+        spill_file.write(self._file.getbuffer())
+        self._file.close()
+        self._file = spill_file
+        self._spilled = True
+
+
+class FrozenBody:
+    """Immutable response body, safe to share between responses.
+
+    Backed by ``bytes``, or by a read-only view of a memory-mapped file for
+    bodies that were spilled to disk.
+    """
+
+    def __init__(self, content: Union[bytes, memoryview]):
+        self._content: Union[bytes, memoryview] = content
+        self._view: memoryview = memoryview(content)
+
+    @property
+    def size(self) -> int:
+        return self._view.nbytes
+
+    @property
+    def spilled(self) -> bool:
+        return not isinstance(self._content, bytes)
+
+    def getbuffer(self) -> memoryview:
+        # a view per caller, so releasing one does not affect the others
+        return self._view[:]
+
+    def getvalue(self) -> bytes:
+        if isinstance(self._content, bytes):
+            return self._content
+        return self._view.tobytes()
+
+    def close(self) -> None:
+        # the body is released together with the last response using it
+        pass
@@ -0,0 +1,74 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+COALESCE_METHODS: List[str] = ["GET", "HEAD", "OPTIONS"]
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class RequestCoalescer:
+    """Shares one transfer between identical requests that are in flight at the
+    same time (singleflight).
+
+    A coalescer can be shared by sessions running on different threads. The
+    first request for a key performs the transfer, concurrent requests for the
+    same key wait for it and receive its result, or the same exception.
+    Sessions hand every caller its own :meth:`Response.snapshot` of the shared
+    response.
+
+    Basic Usage::
+
+      >>> coalescer = request_curl.RequestCoalescer()
+      >>> s = request_curl.Session(coalescer=coalescer)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.requests: int = 0
+        self.transfers: int = 0
+        self.absorbed: int = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "transfers": self.transfers,
+                "absorbed": self.absorbed,
+                "in_flight": len(self._calls),
+            }
+
+    def do(self, key: Hashable, transfer: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.absorbed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = transfer()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.transfers += 1
+            call.done.set()
+
+        return call.result
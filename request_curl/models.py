@@ -1,13 +1,15 @@
+import copy
 import re
 from io import BytesIO
 import json
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 import zlib
 from http.cookiejar import CookieJar
 
 import brotli
 import pycurl
 
+from request_curl.buffer import BodyBuffer, FrozenBody
 from request_curl.dict import CaseInsensitiveDict
 from request_curl.helper import to_cookiejar
 
@@ -50,27 +52,28 @@ HTTP_RES_HDR = re.compile(r"(?P<version>HTTP\/.*?)\s+(?P<code>\d{3})\s+(?P<messa
 
 class Response:
     def __init__(
-        self, curl: pycurl.Curl, body_output: BytesIO, headers_output: BytesIO
+        self, curl: pycurl.Curl, body_output: BodyBuffer, headers_output: BytesIO
     ):
-        self._curl: pycurl.Curl = curl
-
-        self._body_output: BytesIO = body_output
+        self._body_output: Union[BodyBuffer, FrozenBody] = body_output
         self._headers_output: BytesIO = headers_output
 
-        self._status_code: Optional[int] = int(self._curl.getinfo(pycurl.HTTP_CODE))
+        self._status_code: Optional[int] = int(curl.getinfo(pycurl.HTTP_CODE))
         self._time_info = None
-        self._content = False
+        self._content: Optional[bytes] = None
         self._url = None
         self._text = None
         self._headers = None
         self._history: List[Any] = []
         self._headers_history: List[Any] = []
-        self._cookie_jar = None
 
+        # everything needed from the handle is read now, the session reuses
+        # or closes it once the response is returned
         self._response_info = {}
-        self.__get_curl_info()
+        self.__get_curl_info(curl)
         self.__parse_headers_raw()
-        self.__set_text()
+        self._cookie_jar: CookieJar = to_cookiejar(
+            curl.getinfo(pycurl.INFO_COOKIELIST), self._headers
+        )
 
     @property
     def url(self):
@@ -87,19 +90,55 @@ class Response:
     @property
     def json(self) -> Optional[dict]:
         try:
-            return json.loads(self._text)
+            return json.loads(self.text)
         except ValueError:
             return None
 
     @property
     def content(self) -> Optional[bytes]:
+        if self._content is None:
+            try:
+                self._content = self._body_output.getvalue()
+            except ValueError:
+                return None
+        return self._content
+
+    @property
+    def content_view(self) -> Optional[memoryview]:
+        """Read-only view of the raw body that does not copy it.
+
+        Bodies that were spilled to disk are memory-mapped.
+        """
         try:
-            return self._body_output.getvalue()
+            return self._body_output.getbuffer()
         except ValueError:
             return None
 
+    def close(self) -> None:
+        """Releases the body buffer and its temporary file, if any."""
+        self._body_output.close()
+
+    def snapshot(self) -> "Response":
+        """Returns a copy with its own headers and cookies and an immutable body.
+
+        The body is frozen in place and shared with the copy rather than
+        duplicated; a body spilled to disk stays memory-mapped. Closing one of
+        the responses does not affect the others.
+        """
+        if isinstance(self._body_output, BodyBuffer):
+            self._body_output = self._body_output.freeze()
+        clone = copy.copy(self)
+        clone._headers = self._headers.copy()
+        clone._response_info = dict(self._response_info)
+        clone._cookie_jar = CookieJar()
+        for cookie in self._cookie_jar:
+            clone._cookie_jar.set_cookie(copy.copy(cookie))
+        return clone
+
     @property
     def text(self) -> str:
+        if self._text is None:
+            self.__set_text()
         return self._text
 
     def __set_text(self):
@@ -126,16 +165,14 @@ class Response:
                     except Exception as e:
                         pass
                 else:
-                    self._text = self._body_output.getvalue().decode(
-                        "UTF-8", errors="ignore"
+                    self._text = str(
+                        self._body_output.getbuffer(), "UTF-8", errors="ignore"
                     )
         except Exception:
             self._text = None
 
     @property
     def cookies(self) -> CookieJar:
-        if not self._cookie_jar:
-            self._cookie_jar = to_cookiejar(self._curl.getinfo(4194332), self.headers)
         return self._cookie_jar
 
     def __parse_headers_raw(self):
@@ -168,16 +205,16 @@ class Response:
 
     @staticmethod
     def __decode_gzip(content):
-        return zlib.decompress(content.getvalue(), zlib.MAX_WBITS | 16)
+        return zlib.decompress(content.getbuffer(), zlib.MAX_WBITS | 16)
 
     @staticmethod
     def __decode_br(content):
-        return brotli.decompress(content.getvalue())
+        return brotli.decompress(content.getbuffer())
 
-    def __get_curl_info(self) -> dict:
+    def __get_curl_info(self, curl: pycurl.Curl) -> dict:
         for key, value in CURL_INFO_MAPPING.items():
             try:
-                key_data = self._curl.getinfo(value)
+                key_data = curl.getinfo(value)
             except Exception as e:
                 continue
             else:
@@ -1,14 +1,47 @@
 from http.cookiejar import CookieJar
 from io import BytesIO
-from typing import Dict, Optional, List, Any, Union
+from typing import Dict, Optional, List, Any, Tuple, Union
 import json as _json
-from urllib.parse import quote_plus
+import os
+import tempfile
+import time
+from urllib.parse import quote_plus, urlsplit
 
 import pycurl
 from requests.cookies import cookiejar_from_dict, merge_cookies
 
+from request_curl.buffer import BodyBuffer, DEFAULT_SPOOL_SIZE
+from request_curl.coalesce import COALESCE_METHODS, RequestCoalescer
 from request_curl.helper import get_cookie
-from request_curl.models import Response
+from request_curl.models import CURL_INFO_MAPPING, Response
+from request_curl.proxies import Proxy, ProxyPool, is_proxy_failure, parse_proxy
+from request_curl.state import (
+    STATE_CACHES,
+    STATE_VERSION,
+    dump_cookies,
+    enable_caches,
+    load_cookies,
+    set_cache_files,
+)
+from request_curl.upload import set_body, set_multipart
+
+# data shared by every easy handle of a session, so it outlives handle recycling
+SHARED_DATA: List[int] = [
+    getattr(pycurl, name)
+    for name in ("LOCK_DATA_DNS", "LOCK_DATA_SSL_SESSION", "LOCK_DATA_CONNECT")
+    if hasattr(pycurl, name)
+]
+
+# not exposed by every pycurl release
+ABSTRACT_UNIX_SOCKET: Optional[int] = getattr(pycurl, "ABSTRACT_UNIX_SOCKET", None)
+CONN_ID: Optional[int] = getattr(pycurl, "CONN_ID", None)
+
+PRECONNECT_INFO: List[str] = [
+    "NAMELOOKUP_TIME",
+    "CONNECT_TIME",
+    "APPCONNECT_TIME",
+    "PRIMARY_IP",
+]
 
 
 class Session:
@@ -34,17 +67,31 @@ class Session:
         headers: Dict[str, str] = None,
         cipher_suite: List[str] = None,
         http2: bool = False,
-        proxies: str = "",
+        proxies: Union[str, ProxyPool] = "",
         verify: bool = True,
+        spool_size: int = DEFAULT_SPOOL_SIZE,
+        max_body_size: Optional[int] = None,
+        resolve: Optional[Dict[str, str]] = None,
+        coalescer: Optional[RequestCoalescer] = None,
+        unix_sockets: Optional[Dict[str, str]] = None,
     ):
-        self.curl = pycurl.Curl()
+        self.share = pycurl.CurlShare()
+        for lock_data in SHARED_DATA:
+            self.share.setopt(pycurl.SH_SHARE, lock_data)
+        self.curl = self.__create_curl()
         self.headers = headers if headers else {}
         self.cipher_suite = cipher_suite if cipher_suite else []
         self.http2 = http2
         self.proxies = proxies
         self.verify = verify
+        self.spool_size = spool_size
+        self.max_body_size = max_body_size
+        self.resolve = resolve if resolve else {}
+        self.coalescer = coalescer
+        self.unix_sockets = unix_sockets if unix_sockets else {}
 
         self.__debug_entries = []
+        self.__state_directory: Optional[tempfile.TemporaryDirectory] = None
         self.cookies = cookiejar_from_dict({})
 
     def __enter__(self):
@@ -52,34 +99,138 @@ class Session:
 
     def __exit__(self, *args):
         self.curl.close()
+        self.share.close()
+        if self.__state_directory is not None:
+            self.__state_directory.cleanup()
+
+    def __create_curl(self) -> pycurl.Curl:
+        curl = pycurl.Curl()
+        curl.setopt(pycurl.SHARE, self.share)
+        return curl
+
+    def __set_settings(self, curl: pycurl.Curl) -> None:
+        enable_caches(curl)
 
-    def __set_settings(self):
         if self.headers:
-            self.curl.setopt(
+            curl.setopt(
                 pycurl.HTTPHEADER, [f"{k}: {v}" for k, v in self.headers.items()]
             )
 
         if self.http2:
-            self.curl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2_0)
+            curl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2_0)
         else:
-            self.curl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_1_1)
+            curl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_1_1)
 
         if not self.verify:
-            self.curl.setopt(pycurl.SSL_VERIFYPEER, 0)
-            self.curl.setopt(pycurl.SSL_VERIFYHOST, 0)
-
-        if len(self.proxies) > 0:
-            self.__set_proxies()
+            curl.setopt(pycurl.SSL_VERIFYPEER, 0)
+            curl.setopt(pycurl.SSL_VERIFYHOST, 0)
+            curl.setopt(pycurl.PROXY_SSL_VERIFYPEER, 0)
+            curl.setopt(pycurl.PROXY_SSL_VERIFYHOST, 0)
 
         if len(self.cipher_suite) > 0:
-            self.curl.setopt(pycurl.SSL_CIPHER_LIST, ":".join(self.cipher_suite))
+            curl.setopt(pycurl.SSL_CIPHER_LIST, ":".join(self.cipher_suite))
+
+        if self.resolve:
+            curl.setopt(
+                pycurl.RESOLVE,
+                [
+                    f"{k}:{','.join(v) if isinstance(v, (list, tuple)) else v}"
+                    for k, v in self.resolve.items()
+                ],
+            )
 
-    def __set_proxies(self) -> None:
-        proxy_split: List[str] = self.proxies.split(":")
-        self.curl.setopt(pycurl.PROXYTYPE, pycurl.PROXYTYPE_HTTP)
-        self.curl.setopt(pycurl.PROXY, f"{proxy_split[0]}:{proxy_split[1]}")
-        if len(proxy_split) > 3:
-            self.curl.setopt(pycurl.PROXYUSERPWD, f"{proxy_split[2]}:{proxy_split[3]}")
+    def __set_proxies(
+        self,
+        curl: pycurl.Curl,
+        url: str,
+        proxies: Optional[Union[str, ProxyPool]] = None,
+    ) -> Optional[Proxy]:
+        proxies = proxies if proxies else self.proxies
+        if not proxies:
+            return None
+
+        if isinstance(proxies, ProxyPool):
+            proxy = proxies.select(urlsplit(url).hostname or "")
+            # keep a warm connection per proxy in the connection cache
+            curl.setopt(pycurl.MAXCONNECTS, proxies.max_connections)
+        else:
+            proxy = parse_proxy(proxies)
+
+        curl.setopt(pycurl.PROXY, proxy.url)
+        if proxy.username is not None:
+            curl.setopt(pycurl.PROXYUSERNAME, proxy.username)
+            curl.setopt(pycurl.PROXYPASSWORD, proxy.password or "")
+        return proxy
+
+    def __get_unix_socket(
+        self, url: str, unix_socket: Optional[str] = None
+    ) -> Optional[str]:
+        if unix_socket:
+            return unix_socket
+        parts = urlsplit(url)
+        return self.unix_sockets.get(
+            parts.netloc, self.unix_sockets.get(parts.hostname or "")
+        )
+
+    def __set_unix_socket(
+        self, curl: pycurl.Curl, url: str, unix_socket: Optional[str] = None
+    ) -> None:
+        unix_socket = self.__get_unix_socket(url, unix_socket)
+        if not unix_socket:
+            return
+
+        if unix_socket.startswith("@"):
+            if ABSTRACT_UNIX_SOCKET is None:
+                raise ValueError("Abstract Unix sockets are not supported by pycurl")
+            curl.setopt(ABSTRACT_UNIX_SOCKET, unix_socket[1:])
+        else:
+            curl.setopt(pycurl.UNIX_SOCKET_PATH, unix_socket)
+
+    def __get_coalesce_key(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        params: Optional[Dict[str, str]],
+        proxies: Optional[Union[str, ProxyPool]],
+        timeout: Union[float, int],
+        allow_redirects: bool,
+        http2: bool,
+        verify: bool,
+        max_body_size: Optional[int],
+        unix_socket: Optional[str],
+    ) -> Tuple[Any, ...]:
+        # every option that can change the outcome of the transfer, with the
+        # session settings applied the same way request() applies them
+        request_headers = headers if headers else self.headers
+        return (
+            method.upper(),
+            url,
+            tuple(sorted(params.items())) if params else (),
+            tuple(sorted((k.lower(), v) for k, v in request_headers.items())),
+            self.__get_cookie_header(),
+            proxies if proxies else self.proxies,
+            timeout,
+            allow_redirects,
+            http2 or self.http2,
+            verify and self.verify,
+            max_body_size or self.max_body_size,
+            tuple(self.cipher_suite),
+            tuple(
+                sorted(
+                    (k, tuple(v) if isinstance(v, (list, tuple)) else v)
+                    for k, v in self.resolve.items()
+                )
+            ),
+            self.__get_unix_socket(url, unix_socket),
+        )
+
+    def __get_cookie_header(self) -> str:
+        chunks = []
+        for cookie in self.cookies:
+            name, value = quote_plus(cookie.name), quote_plus(cookie.value)
+            chunks.append(f"{name}={value};")
+        return "".join(chunks)
 
     def __add_cookies_to_session(self, cookies: CookieJar) -> None:
         self.cookies = merge_cookies(self.cookies, cookies)
@@ -90,20 +241,176 @@ class Session:
     def remove_all_cookies(self) -> None:
         self.cookies = cookiejar_from_dict({})
 
+    def save_state(self, path: str) -> None:
+        """Persists cookies and the HSTS and Alt-Svc caches to ``path``.
+
+        libcurl only writes its caches when a handle is closed, so the easy
+        handle is recycled. Connections, DNS entries and TLS sessions live in
+        the session's share handle and survive this. TLS session tickets are
+        kept for the lifetime of the session only, since pycurl offers no way
+        to export them.
+        """
+        directory = self.__get_state_directory()
+        paths = set_cache_files(self.curl, directory)
+        self.curl.close()
+        self.curl = self.__create_curl()
+        set_cache_files(self.curl, directory)
+
+        caches: Dict[str, str] = {}
+        for name, cache_path in paths.items():
+            if os.path.exists(cache_path):
+                with open(cache_path) as f:
+                    caches[name] = f.read()
+
+        state = {
+            "version": STATE_VERSION,
+            "cookies": dump_cookies(self.cookies),
+            **caches,
+        }
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            _json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def load_state(self, path: str) -> None:
+        """Restores cookies and caches written by :meth:`save_state`."""
+        with open(path) as f:
+            state = _json.load(f)
+
+        load_cookies(self.cookies, state.get("cookies", []))
+
+        directory = self.__get_state_directory()
+        for name in STATE_CACHES:
+            if state.get(name):
+                with open(os.path.join(directory, name), "w") as f:
+                    f.write(state[name])
+        set_cache_files(self.curl, directory)
+
+    def preconnect(
+        self,
+        urls: List[str],
+        resolve: Optional[Dict[str, str]] = None,
+        connect_only: bool = False,
+        timeout: Union[float, int] = 10,
+    ) -> Dict[str, Any]:
+        """Opens connections to ``urls`` in parallel ahead of a burst of requests.
+
+        Every URL is warmed with a ``HEAD`` request using the session's
+        headers, cipher suite and HTTP version, which leaves the connection in
+        the session's connection cache. libcurl never hands ``CONNECT_ONLY``
+        connections back to the cache, so ``connect_only=True`` only warms the
+        DNS and TLS session caches, without sending a request.
+
+        :param urls: URLs to connect to.
+        :param resolve: (optional) Dictionary of ``"host:port"`` to addresses
+            (``CURLOPT_RESOLVE``), kept for all later requests of the session.
+        :param connect_only: (optional) Only resolve and handshake.
+        :param timeout: (optional) Timeout per URL in seconds.
+        :return: Total warmup time, number of connections kept alive in the
+            cache, number of connections opened and timings per URL.
+        """
+        if resolve:
+            self.resolve.update(resolve)
+
+        multi = pycurl.CurlMulti()
+        handles: List[Tuple[str, pycurl.Curl, Optional[Proxy]]] = []
+        # a duplicate URL would only race for the same connection
+        for url in dict.fromkeys(urls):
+            curl = self.__create_curl()
+            self.__set_settings(curl)
+            proxy = self.__set_proxies(curl, url)
+            self.__set_unix_socket(curl, url)
+            curl.setopt(pycurl.URL, url)
+            curl.setopt(pycurl.TIMEOUT, timeout)
+            curl.setopt(pycurl.CONNECT_ONLY if connect_only else pycurl.NOBODY, 1)
+            multi.add_handle(curl)
+            handles.append((url, curl, proxy))
+
+        started = time.monotonic()
+        num_handles = len(handles)
+        while num_handles:
+            while True:
+                ret, num_handles = multi.perform()
+                if ret != pycurl.E_CALL_MULTI_PERFORM:
+                    break
+            if num_handles:
+                multi.select(1.0)
+        elapsed = time.monotonic() - started
+
+        errors: Dict[pycurl.Curl, Tuple[int, str]] = {}
+        num_queued = 1
+        while num_queued:
+            num_queued, _, failed = multi.info_read()
+            for curl, error, message in failed:
+                errors[curl] = (error, message)
+
+        result: Dict[str, Any] = {
+            "elapsed": elapsed,
+            "connections": 0,
+            "opened": 0,
+            "urls": {},
+        }
+        connection_ids = set()
+        for url, curl, proxy in handles:
+            multi.remove_handle(curl)
+            if curl in errors:
+                error, message = errors[curl]
+                result["urls"][url] = {"error": message}
+                if isinstance(self.proxies, ProxyPool) and is_proxy_failure(
+                    curl, proxy, error
+                ):
+                    self.proxies.report_failure(proxy)
+            else:
+                result["urls"][url] = {
+                    key: curl.getinfo(CURL_INFO_MAPPING[key]) for key in PRECONNECT_INFO
+                }
+                result["opened"] += curl.getinfo(pycurl.NUM_CONNECTS)
+                if CONN_ID is not None:
+                    # handles that reused or multiplexed a connection report
+                    # the same connection id
+                    connection_ids.add(curl.getinfo(CONN_ID))
+                if isinstance(self.proxies, ProxyPool):
+                    if is_proxy_failure(curl, proxy):
+                        self.proxies.report_failure(proxy)
+                    else:
+                        self.proxies.report(proxy)
+            curl.close()
+        multi.close()
+
+        # CONNECT_ONLY connections are closed together with their handle
+        if not connect_only:
+            result["connections"] = (
+                len(connection_ids) if CONN_ID is not None else result["opened"]
+            )
+
+        return result
+
+    def __get_state_directory(self) -> str:
+        # libcurl reads cache files lazily before a transfer, so they have to
+        # stay around for as long as the session
+        if self.__state_directory is None:
+            self.__state_directory = tempfile.TemporaryDirectory(prefix="request_curl-")
+        return self.__state_directory.name
+
     def request(
         self,
         method: str,
         url: str,
         headers: Optional[Dict[str, str]] = None,
         params: Optional[Dict[str, str]] = None,
-        data: Optional[Dict[str, Any]] = None,
+        data: Optional[Any] = None,
         json: Optional[Dict[str, Any]] = None,
-        proxies: Optional[str] = None,
+        files: Optional[Dict[str, Any]] = None,
+        proxies: Optional[Union[str, ProxyPool]] = None,
         timeout: Union[float, int] = 60,
         allow_redirects: bool = True,
         http2: bool = False,
         verify: bool = True,
         debug: bool = False,
+        max_body_size: Optional[int] = None,
+        coalesce: bool = True,
+        unix_socket: Optional[str] = None,
     ):
         """Constructs a :class:`Request <Request>`, prepares it and sends it.
         Returns :class:`Response <Response>` object.
@@ -113,13 +420,19 @@ class Session:
         :param params: (optional) Dictionary or bytes to be sent in the query
             string for the :class:`Request`.
         :param data: (optional) Dictionary, list of tuples, bytes, or file-like
-            object to send in the body of the :class:`Request`.
+            object to send in the body of the :class:`Request`. File-like
+            objects, memoryviews and generators are streamed.
         :param json: (optional) json to send in the body of the
             :class:`Request`.
+        :param files: (optional) Dictionary of ``'name': file-like-objects``
+            (or ``{'name': file-tuple}``) for multipart encoding upload.
+            ``file-tuple`` can be a 2-tuple ``('filename', fileobj)`` or a
+            3-tuple ``('filename', fileobj, 'content_type')``.
         :param headers: (optional) Dictionary of HTTP Headers to send with the
             :class:`Request`.
-        :param proxies: (optional) URL of the proxy.
-        :type proxies: string
+        :param proxies: (optional) URL of the proxy or a :class:`ProxyPool`
+            to pick one from. Overrides the session proxies for this request.
+        :type proxies: string or ProxyPool
         :param timeout: (optional) How long to wait for the server to send
             data before giving up, as a float, or a :ref:`(connect timeout,
             read timeout) <timeouts>` tuple.
@@ -138,10 +451,64 @@ class Session:
             may be useful during local development or testing.
         :param debug: (optional) Set debug mode.
         :type debug: bool
+        :param max_body_size: (optional) Abort the transfer once the response
+            body exceeds this many bytes. Defaults to the session setting.
+        :type max_body_size: int
+        :param coalesce: (optional) Share the transfer with identical requests
+            in flight when the session has a :class:`RequestCoalescer`.
+        :type coalesce: bool
+        :param unix_socket: (optional) Path of a Unix domain socket to connect
+            to instead of the URL's host, or ``@name`` for an abstract socket.
+            Defaults to the session's ``unix_sockets`` entry for the host.
+        :type unix_socket: str
         :rtype: Response
         """
+        if (
+            coalesce
+            and self.coalescer is not None
+            and method.upper() in COALESCE_METHODS
+            and not (data or json or files)
+        ):
+            key = self.__get_coalesce_key(
+                method,
+                url,
+                headers=headers,
+                params=params,
+                proxies=proxies,
+                timeout=timeout,
+                allow_redirects=allow_redirects,
+                http2=http2,
+                verify=verify,
+                max_body_size=max_body_size,
+                unix_socket=unix_socket,
+            )
+
+            def transfer() -> Response:
+                response = self.request(
+                    method,
+                    url,
+                    headers=headers,
+                    params=params,
+                    proxies=proxies,
+                    timeout=timeout,
+                    allow_redirects=allow_redirects,
+                    http2=http2,
+                    verify=verify,
+                    debug=debug,
+                    max_body_size=max_body_size,
+                    coalesce=False,
+                    unix_socket=unix_socket,
+                )
+                # publish an immutable copy, so waiting requests never touch
+                # the leader's buffer
+                return response.snapshot()
+
+            response = self.coalescer.do(key, transfer).snapshot()
+            self.__add_cookies_to_session(response.cookies)
+            return response
+
         self.curl.reset()
-        self.__set_settings()
+        self.__set_settings(self.curl)
 
         if method.upper() == "POST":
             self.curl.setopt(pycurl.POST, 1)
@@ -162,10 +529,12 @@ class Session:
         if not verify:
             self.curl.setopt(pycurl.SSL_VERIFYPEER, 0)
             self.curl.setopt(pycurl.SSL_VERIFYHOST, 0)
+            self.curl.setopt(pycurl.PROXY_SSL_VERIFYPEER, 0)
+            self.curl.setopt(pycurl.PROXY_SSL_VERIFYHOST, 0)
 
-        if proxies:
-            self.proxies = proxies
-            self.__set_proxies()
+        pool = proxies if proxies else self.proxies
+        proxy = self.__set_proxies(self.curl, url, proxies)
+        self.__set_unix_socket(self.curl, url, unix_socket)
 
         if http2:
             self.curl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2_0)
@@ -175,9 +544,13 @@ class Session:
                 pycurl.HTTPHEADER, [f"{k}: {v}" for k, v in headers.items()]
             )
 
-        if data:
-            form: List[str] = [f"{k}={v}" for k, v in data.items()]
-            self.curl.setopt(pycurl.POSTFIELDS, "&".join(form).encode("utf-8"))
+        # libcurl reads the MIME parts while sending, so the handle stays
+        # referenced until perform() has returned
+        multipart: Any = None
+        if files:
+            multipart = set_multipart(self.curl, files, data)
+        elif data:
+            set_body(self.curl, method.upper(), data)
 
         if json:
             headers = headers.copy() if headers else self.headers.copy()
@@ -193,28 +566,49 @@ class Session:
                 json_data = _json.dumps(json)
                 self.curl.setopt(pycurl.POSTFIELDS, json_data)
 
-        if self.cookies:
-            chunks = []
-            for cookie in self.cookies:
-                name, value = quote_plus(cookie.name), quote_plus(cookie.value)
-                chunks.append(f"{name}={value};")
-            if chunks:
-                self.curl.setopt(pycurl.COOKIE, "".join(chunks))
+        cookie_header = self.__get_cookie_header()
+        if cookie_header:
+            self.curl.setopt(pycurl.COOKIE, cookie_header)
 
         if debug:
             self.__debug_entries = []
             self.curl.setopt(pycurl.VERBOSE, 1)
 
-        body_output: BytesIO = BytesIO()
+        max_body_size = max_body_size or self.max_body_size
+        if max_body_size:
+            self.curl.setopt(pycurl.MAXFILESIZE_LARGE, max_body_size)
+
+        body_output: BodyBuffer = BodyBuffer(self.spool_size, max_body_size)
         headers_output: BytesIO = BytesIO()
         self.curl.setopt(pycurl.HEADERFUNCTION, headers_output.write)
         self.curl.setopt(pycurl.WRITEFUNCTION, body_output.write)
 
-        self.curl.perform()
+        try:
+            self.curl.perform()
+        except pycurl.error as e:
+            body_output.close()
+            # errors caused by the upstream or by the request itself, such as
+            # an oversized body, say nothing about the proxy's health
+            if isinstance(pool, ProxyPool) and is_proxy_failure(
+                self.curl, proxy, e.args[0]
+            ):
+                pool.report_failure(proxy)
+            if body_output.exceeded:
+                raise pycurl.error(
+                    pycurl.E_FILESIZE_EXCEEDED,
+                    f"Response body exceeded max_body_size of {max_body_size} bytes",
+                )
+            raise
 
         if debug:
             print("\n".join(self.__debug_entries))
 
+        if isinstance(pool, ProxyPool):
+            if is_proxy_failure(self.curl, proxy):
+                pool.report_failure(proxy)
+            else:
+                pool.report(proxy, self.curl.getinfo(pycurl.STARTTRANSFER_TIME))
+
         response = Response(self.curl, body_output, headers_output)
         self.__add_cookies_to_session(response.cookies)
 
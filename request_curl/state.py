@@ -0,0 +1,65 @@
+import os
+from http.cookiejar import CookieJar
+from typing import Any, Dict, List, Tuple
+
+import pycurl
+from requests.cookies import create_cookie
+
+STATE_VERSION: int = 1
+
+# libcurl caches that are persisted as part of the session state, mapped to
+# their (control option, file option, enable flags). Alt-Svc is only
+# available when the installed pycurl exposes CURLOPT_ALTSVC.
+STATE_CACHES: Dict[str, Tuple[int, int, int]] = {
+    name: options
+    for name, options in {
+        "hsts": (
+            getattr(pycurl, "HSTS_CTRL", None),
+            getattr(pycurl, "HSTS", None),
+            getattr(pycurl, "CURLHSTS_ENABLE", 1),
+        ),
+        "altsvc": (
+            getattr(pycurl, "ALTSVC_CTRL", None),
+            getattr(pycurl, "ALTSVC", None),
+            # CURLALTSVC_H1 | CURLALTSVC_H2 | CURLALTSVC_H3
+            (1 << 3) | (1 << 4) | (1 << 5),
+        ),
+    }.items()
+    if None not in options
+}
+
+
+def dump_cookies(cookies: CookieJar) -> List[List[Any]]:
+    return [
+        [c.domain, c.path, c.name, c.value, c.secure, c.expires]
+        for c in cookies
+        if not c.is_expired()
+    ]
+
+
+def load_cookies(cookies: CookieJar, entries: List[List[Any]]) -> None:
+    for domain, path, name, value, secure, expires in entries:
+        cookies.set_cookie(
+            create_cookie(
+                name, value, domain=domain, path=path, secure=secure, expires=expires
+            )
+        )
+
+
+def enable_caches(curl: pycurl.Curl) -> None:
+    for ctrl, _, flags in STATE_CACHES.values():
+        curl.setopt(ctrl, flags)
+
+
+def set_cache_files(curl: pycurl.Curl, directory: str) -> Dict[str, str]:
+    """Points every persisted cache at a file in ``directory``.
+
+    libcurl reads a cache file before each transfer and writes the in-memory
+    cache back to it when the handle is closed.
+    """
+    paths: Dict[str, str] = {}
+    for name, (ctrl, option, flags) in STATE_CACHES.items():
+        paths[name] = os.path.join(directory, name)
+        curl.setopt(ctrl, flags)
+        curl.setopt(option, paths[name])
+    return paths
@@ -0,0 +1,229 @@
+import io
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlencode
+
+import pycurl
+
+CHUNK_SIZE: int = 64 * 1024
+
+
+class BodyReader:
+    """Feeds a request body to libcurl piece by piece through ``READFUNCTION``.
+
+    Accepts file-like objects, ``memoryview``/``bytearray`` buffers and
+    iterables of ``bytes``. Only the chunk libcurl asks for is materialised,
+    so memory use stays flat regardless of the payload size. Text is encoded
+    as UTF-8, so files opened in text mode are sent with an unknown length.
+    """
+
+    def __init__(self, source: Any):
+        self._source = source
+        self._view: Optional[memoryview] = None
+        self._iterator: Optional[Iterator[bytes]] = None
+        self._pending: memoryview = memoryview(b"")
+        self._position: int = 0
+
+        if isinstance(source, (memoryview, bytearray)):
+            self._view = memoryview(source).cast("B")
+        elif isinstance(source, io.TextIOBase):
+            self._iterator = iter(lambda: source.read(CHUNK_SIZE), "")
+        elif not hasattr(source, "read"):
+            self._iterator = iter(source)
+
+        self.size: Optional[int] = self.__get_size()
+
+    def read(self, size: int) -> bytes:
+        if self._view is not None:
+            chunk = self._view[self._position : self._position + size]
+            self._position += len(chunk)
+            return chunk.tobytes()
+
+        if self._iterator is None:
+            return self._source.read(size)
+
+        while not self._pending:
+            try:
+                chunk = next(self._iterator)
+            except StopIteration:
+                return b""
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            self._pending = memoryview(chunk).cast("B")
+
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk.tobytes()
+
+    def __get_size(self) -> Optional[int]:
+        if self._view is not None:
+            return self._view.nbytes
+
+        if self._iterator is not None:
+            return None
+
+        # wrappers such as GzipFile report the descriptor of another stream,
+        # so only trust fstat for plain files
+        raw = getattr(self._source, "raw", self._source)
+        if isinstance(raw, io.FileIO) and isinstance(
+            self._source, (io.FileIO, io.BufferedReader, io.BufferedRandom)
+        ):
+            try:
+                remaining = os.fstat(raw.fileno()).st_size - self._source.tell()
+                return max(remaining, 0)
+            except (OSError, ValueError):
+                pass
+
+        try:
+            position = self._source.tell()
+            end = self._source.seek(0, os.SEEK_END)
+            self._source.seek(position)
+            return end - position
+        except (AttributeError, OSError, ValueError):
+            return None
+
+
+def encode_form(data: Union[Dict[str, Any], List[Tuple[str, Any]]]) -> bytes:
+    return urlencode(data, doseq=True).encode("utf-8")
+
+
+def set_body(curl: pycurl.Curl, method: str, data: Any) -> None:
+    """Attaches ``data`` as the request body.
+
+    ``str``/``bytes`` and form mappings go through ``POSTFIELDS``; everything
+    else is streamed with ``READFUNCTION``, using a fixed length when the size
+    is known and chunked transfer encoding otherwise.
+    """
+    if isinstance(data, (dict, list, tuple)):
+        data = encode_form(data)
+
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    if isinstance(data, bytes):
+        curl.setopt(pycurl.POSTFIELDS, data)
+        curl.setopt(pycurl.POSTFIELDSIZE_LARGE, len(data))
+        if method != "POST":
+            curl.setopt(pycurl.CUSTOMREQUEST, method)
+        return
+
+    reader = BodyReader(data)
+    curl.setopt(pycurl.READFUNCTION, reader.read)
+
+    if method == "POST":
+        curl.setopt(pycurl.POST, 1)
+        curl.setopt(
+            pycurl.POSTFIELDSIZE_LARGE, -1 if reader.size is None else reader.size
+        )
+    else:
+        curl.setopt(pycurl.UPLOAD, 1)
+        curl.setopt(pycurl.CUSTOMREQUEST, method)
+        if reader.size is not None:
+            curl.setopt(pycurl.INFILESIZE_LARGE, reader.size)
+
+
+def set_multipart(
+    curl: pycurl.Curl,
+    files: Dict[str, Any],
+    data: Optional[Union[Dict[str, Any], List[Tuple[str, Any]]]] = None,
+) -> Any:
+    """Builds a multipart/form-data body from ``files`` and optional ``data`` fields.
+
+    Each ``files`` value is ``bytes`` or ``str`` content, an ``os.PathLike``
+    path, a file object, or a ``(filename, content[, content_type])`` tuple.
+    Files on disk are read by libcurl itself while sending. Returns the MIME
+    handle, which must stay alive until the transfer completes.
+
+    pycurl releases without ``CurlMime`` fall back to ``HTTPPOST``, which
+    cannot stream: file objects that are not backed by a file on disk and
+    iterables are read into memory before the transfer starts.
+    """
+    fields: List[Tuple[str, Any]] = list(
+        data.items() if isinstance(data, dict) else data or []
+    )
+    parts: List[Tuple[str, Optional[str], Any, Optional[str]]] = [
+        (name, *_normalize_file(value)) for name, value in files.items()
+    ]
+
+    if hasattr(pycurl, "CurlMime"):
+        return _set_mime(curl, fields, parts)
+
+    form: List[Tuple[str, Any]] = [(str(k), str(v)) for k, v in fields]
+    for name, filename, content, content_type in parts:
+        if isinstance(content, str):
+            entry: List[Any] = [pycurl.FORM_FILE, content]
+        else:
+            if not isinstance(content, bytes):
+                reader = BodyReader(content)
+                content = b"".join(iter(lambda: reader.read(CHUNK_SIZE), b""))
+            entry = [
+                pycurl.FORM_BUFFER,
+                filename or name,
+                pycurl.FORM_BUFFERPTR,
+                content,
+            ]
+        if filename and isinstance(content, str):
+            entry += [pycurl.FORM_FILENAME, filename]
+        if content_type:
+            entry += [pycurl.FORM_CONTENTTYPE, content_type]
+        form.append((name, tuple(entry)))
+
+    curl.setopt(pycurl.HTTPPOST, form)
+    return form
+
+
+def _set_mime(
+    curl: pycurl.Curl,
+    fields: List[Tuple[str, Any]],
+    parts: List[Tuple[str, Optional[str], Any, Optional[str]]],
+) -> Any:
+    mime = pycurl.CurlMime(curl)
+
+    for name, value in fields:
+        mime.add_field(str(name), str(value))
+
+    for name, filename, content, content_type in parts:
+        part = mime.addpart()
+        part.name(name)
+        if isinstance(content, str):
+            part.filedata(content)
+        elif isinstance(content, bytes):
+            part.data(content)
+        else:
+            reader = BodyReader(content)
+            part.data_cb(
+                -1 if reader.size is None else reader.size,
+                lambda _, size, reader=reader: reader.read(size),
+            )
+        if filename:
+            part.filename(filename)
+        if content_type:
+            part.type(content_type)
+
+    curl.setopt(pycurl.MIMEPOST, mime)
+    return mime
+
+
+def _normalize_file(value: Any) -> Tuple[Optional[str], Any, Optional[str]]:
+    if isinstance(value, tuple):
+        filename, content = value[0], value[1]
+        content_type = value[2] if len(value) > 2 else None
+    else:
+        filename, content, content_type = None, value, None
+        name = os.fsdecode(value) if isinstance(value, os.PathLike) else None
+        name = name or getattr(value, "name", None)
+        if isinstance(name, str):
+            filename = os.path.basename(name)
+
+    # strings are content, like in requests; only explicit paths and file
+    # objects backed by a real file are handed to libcurl by path, so it can
+    # read them from disk while sending
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    elif isinstance(content, os.PathLike):
+        content = os.fsdecode(content)
+    else:
+        name = getattr(content, "name", None)
+        if isinstance(name, str) and os.path.isfile(name) and not content.tell():
+            content = name
+
+    return filename, content, content_type
@@ -0,0 +1,125 @@
+"""Compares request latency over a Unix domain socket and loopback TCP.
+
+Both transports are served by the same local stand-in HTTP server, so the
+numbers only differ by the socket layer. Run from the repository root::
+
+    python -m tests.benchmark_unix_socket --requests 2000
+"""
+
+import argparse
+import os
+import socket
+import socketserver
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from typing import Callable, Dict, List
+
+import request_curl
+
+
+class SidecarHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    body = b'{"status":"ok"}'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def address_string(self):
+        return "local"
+
+    def log_message(self, *args):
+        pass
+
+
+class TCPSidecarHandler(SidecarHandler):
+    # without TCP_NODELAY the stand-in server trips over delayed ACKs and the
+    # TCP numbers end up measuring the ACK timer instead of the socket layer
+    disable_nagle_algorithm = True
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ("local", 0)
+
+
+class TCPHTTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def measure(fetch: Callable[[], object], requests: int, warmup: int) -> List[float]:
+    for _ in range(warmup):
+        fetch()
+
+    timings: List[float] = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        fetch()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        "mean": statistics.mean(timings) * 1e6,
+        "p50": timings[len(timings) // 2] * 1e6,
+        "p99": timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    args = parser.parse_args()
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("Unix domain sockets are not available on this platform")
+
+    directory = tempfile.TemporaryDirectory(prefix="request_curl-bench-")
+    socket_path = os.path.join(directory.name, "sidecar.sock")
+    unix_server = UnixHTTPServer(socket_path, SidecarHandler)
+    tcp_server = TCPHTTPServer(("127.0.0.1", 0), TCPSidecarHandler)
+    for server in (unix_server, tcp_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    tcp_url = f"http://127.0.0.1:{tcp_server.server_address[1]}/status"
+    unix_url = "http://sidecar.local/status"
+    close = {"Connection": "close"}
+
+    try:
+        with request_curl.Session(unix_sockets={"sidecar.local": socket_path}) as s:
+            rounds = {
+                "keep-alive tcp": lambda: s.get(tcp_url),
+                "keep-alive unix": lambda: s.get(unix_url),
+                "new connection tcp": lambda: s.get(tcp_url, headers=close),
+                "new connection unix": lambda: s.get(unix_url, headers=close),
+            }
+
+            print(f"{'':<22}{'mean':>10}{'p50':>10}{'p99':>10}  (us)")
+            for name, fetch in rounds.items():
+                stats = summarize(measure(fetch, args.requests, args.warmup))
+                print(
+                    f"{name:<22}"
+                    f"{stats['mean']:>10.1f}{stats['p50']:>10.1f}{stats['p99']:>10.1f}"
+                )
+    finally:
+        for server in (unix_server, tcp_server):
+            server.shutdown()
+            server.server_close()
+        directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
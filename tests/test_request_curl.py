@@ -1,6 +1,20 @@
+import gzip
+import io
+import mmap
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pycurl
+import pytest
+
 import request_curl
-from request_curl import CHROME_CIPHER_SUITE, CHROME_HEADERS, CHROME_UA
+from request_curl import CHROME_CIPHER_SUITE, CHROME_HEADERS, CHROME_UA, ProxyPool
+from request_curl.buffer import BodyBuffer
 from request_curl.dict import CaseInsensitiveDict
+from request_curl.upload import BodyReader
 
 TLS_API: str = "https://tls.notifysolutions.eu/api/all"
 HTTP_BIN_API: str = "https://httpbin.org"
@@ -159,3 +173,316 @@ def test_brotli_content_encoding(session):
 
     response = session.get(BROWSER_LEAKS)
     assert len(response.text) > 0
+
+
+def test_request_streaming_body(session):
+    chunks = (b"chunk-%d;" % i for i in range(3))
+    response = session.post(HTTP_BIN_API + "/post", data=chunks)
+
+    assert response.json["data"] == "chunk-0;chunk-1;chunk-2;"
+
+    response = session.put(HTTP_BIN_API + "/put", data=memoryview(b"x" * 1024))
+
+    assert response.json["data"] == "x" * 1024
+
+    response = session.put(HTTP_BIN_API + "/put", data=io.StringIO("é" * 70000))
+
+    assert response.json["data"] == "é" * 70000
+
+
+def test_request_streaming_body_size(tmp_path):
+    path = tmp_path / "body.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(b"x" * 100000)
+
+    # fstat on a GzipFile describes the compressed file, not the body
+    with gzip.open(path, "rb") as f:
+        assert BodyReader(f).size == 100000
+    with open(path, "rb") as f:
+        assert BodyReader(f).size == path.stat().st_size
+
+
+def test_request_files(session):
+    files = {"upload": ("hello.txt", b"hello world", "text/plain")}
+    response = session.post(HTTP_BIN_API + "/post", files=files, data={"key": "value"})
+
+    assert response.json["files"]["upload"] == "hello world"
+    assert response.json["form"] == {"key": "value"}
+
+    # strings are sent as content, never read from disk
+    response = session.post(HTTP_BIN_API + "/post", files={"note": "hello"})
+
+    assert response.json["form"] == {"note": "hello"}
+
+
+def test_response_content_view(session):
+    session.spool_size = 512
+    response = session.get(HTTP_BIN_API + "/bytes/2048")
+
+    assert isinstance(response.content_view, memoryview)
+    assert response.content_view.nbytes == 2048
+    assert bytes(response.content_view) == response.content
+
+
+def test_body_buffer_freeze():
+    buffer = BodyBuffer(spool_size=512)
+    buffer.write(b"x" * 2048)
+    frozen = buffer.freeze()
+
+    # a spilled body stays memory-mapped instead of being read back
+    assert frozen.spilled
+    assert isinstance(frozen.getbuffer().obj, mmap.mmap)
+    assert frozen.getvalue() == b"x" * 2048
+
+
+def test_max_body_size(session):
+    with pytest.raises(pycurl.error):
+        session.get(HTTP_BIN_API + "/bytes/2048", max_body_size=1024)
+
+
+def test_session_state(session, tmp_path):
+    session.add_cookie("key", "value")
+    response = session.get(HTTP_BIN_API + "/get")
+    session.save_state(str(tmp_path / "state.json"))
+
+    # responses no longer depend on the recycled curl handle
+    assert len(response.cookies) == 0
+
+    with request_curl.Session(verify=False) as restored:
+        restored.load_state(str(tmp_path / "state.json"))
+        response = restored.get(HTTP_BIN_API + "/cookies")
+
+        assert response.json["cookies"] == {"key": "value"}
+
+
+def test_preconnect(session):
+    result = session.preconnect([HTTP_BIN_API, TLS_API, HTTP_BIN_API])
+
+    assert result["connections"] == 2
+    assert len(result["urls"]) == 2
+    assert all("error" not in info for info in result["urls"].values())
+
+    response = session.get(HTTP_BIN_API + "/get")
+    assert response.status_code == 200
+
+
+def test_proxy_pool():
+    pool = ProxyPool(
+        ["127.0.0.1:8080:user:password", "socks5://127.0.0.1:1080"],
+        max_failures=1,
+    )
+
+    assert pool.proxies[0].url == "http://127.0.0.1:8080"
+    assert pool.proxies[0].username == "user"
+    assert pool.proxies[1].url == "socks5://127.0.0.1:1080"
+    assert [pool.select().port for _ in range(3)] == [8080, 1080, 8080]
+
+    pool.report_failure(pool.proxies[1])
+    assert pool.proxies[1].quarantined
+    assert {pool.select().port for _ in range(3)} == {8080}
+
+    sticky = ProxyPool(["127.0.0.1:8080", "127.0.0.1:8081"], strategy="sticky")
+    assert sticky.select("a.com") is sticky.select("a.com")
+    assert sticky.select("a.com") is not sticky.select("b.com")
+
+    # without a port libcurl uses the scheme's default
+    assert ProxyPool(["socks5://10.0.0.1"]).proxies[0].url == "socks5://10.0.0.1"
+    with pytest.raises(ValueError):
+        ProxyPool(["socks5://:1080"])
+
+
+def test_request_coalescing():
+    coalescer = request_curl.RequestCoalescer()
+    responses = []
+
+    def fetch():
+        with request_curl.Session(verify=False, coalescer=coalescer) as session:
+            responses.append(session.get(HTTP_BIN_API + "/delay/1"))
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(response) for response in responses}) == 4
+    assert len({response.content for response in responses}) == 1
+    responses[0].close()
+    assert responses[1].json["url"].endswith("/delay/1")
+    assert coalescer.stats["transfers"] == 1
+    assert coalescer.stats["absorbed"] == 3
+
+
+def test_request_coalescing_options():
+    coalescer = request_curl.RequestCoalescer()
+
+    def fetch(**kwargs):
+        with request_curl.Session(verify=False, coalescer=coalescer) as session:
+            session.get(HTTP_BIN_API + "/delay/1", **kwargs)
+
+    threads = [
+        threading.Thread(target=fetch),
+        threading.Thread(target=fetch, kwargs={"allow_redirects": False}),
+        threading.Thread(target=fetch, kwargs={"max_body_size": 1024 * 1024}),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert coalescer.stats["transfers"] == 3
+    assert coalescer.stats["absorbed"] == 0
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ("local", 0)
+
+
+class EchoHostHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = self.headers["Host"].encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="requires Unix sockets")
+def test_unix_socket(tmp_path):
+    socket_path = str(tmp_path / "sidecar.sock")
+    server = UnixHTTPServer(socket_path, EchoHostHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        with request_curl.Session(unix_sockets={"sidecar.local": socket_path}) as s:
+            response = s.get("http://sidecar.local/metrics")
+            assert response.status_code == 200
+            assert response.text == "sidecar.local"
+
+            response = s.get("http://other.local/", unix_socket=socket_path)
+            assert response.text == "other.local"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class SocketNameHandler(EchoHostHandler):
+    def do_GET(self):
+        # keep the request in flight long enough for the others to join it
+        time.sleep(0.2)
+        body = self.server.server_address.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="requires Unix sockets")
+def test_unix_socket_coalescing(tmp_path):
+    socket_paths = [str(tmp_path / "a.sock"), str(tmp_path / "b.sock")]
+    servers = [UnixHTTPServer(path, SocketNameHandler) for path in socket_paths]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    coalescer = request_curl.RequestCoalescer()
+    responses = {}
+
+    def fetch(socket_path):
+        unix_sockets = {"sidecar.local": socket_path}
+        with request_curl.Session(unix_sockets=unix_sockets, coalescer=coalescer) as s:
+            responses[socket_path] = s.get("http://sidecar.local/").text
+
+    threads = [threading.Thread(target=fetch, args=(path,)) for path in socket_paths]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    assert responses == {path: path for path in socket_paths}
+    assert coalescer.stats["transfers"] == 2
+
+
+def test_proxy_pool_connection_reuse():
+    # plain HTTP proxies answer absolute-URI requests themselves
+    proxies = [ThreadingHTTPServer(("127.0.0.1", 0), EchoHostHandler) for _ in range(8)]
+    for proxy in proxies:
+        threading.Thread(target=proxy.serve_forever, daemon=True).start()
+
+    pool = ProxyPool([f"127.0.0.1:{proxy.server_address[1]}" for proxy in proxies])
+    try:
+        with request_curl.Session(proxies=pool) as s:
+            for _ in proxies:
+                assert s.get("http://upstream.local/").text == "upstream.local"
+            # the second round reuses the cached connection to every proxy
+            for _ in proxies:
+                response = s.get("http://upstream.local/")
+                assert response._response_info["NUM_CONNECTS"] == 0
+            assert all(proxy.successes == 2 for proxy in pool.proxies)
+    finally:
+        for proxy in proxies:
+            proxy.shutdown()
+            proxy.server_close()
+
+
+def test_proxy_pool_failures():
+    proxy = ThreadingHTTPServer(("127.0.0.1", 0), EchoHostHandler)
+    threading.Thread(target=proxy.serve_forever, daemon=True).start()
+
+    pool = ProxyPool([f"127.0.0.1:{proxy.server_address[1]}"], max_failures=1)
+    try:
+        with request_curl.Session(proxies=pool) as s:
+            # libcurl rejects the announced Content-Length itself
+            with pytest.raises(pycurl.error):
+                s.get("http://upstream.local/", max_body_size=5)
+            assert pool.proxies[0].failures == 0
+    finally:
+        proxy.shutdown()
+        proxy.server_close()
+
+    with request_curl.Session(proxies=pool) as s:
+        with pytest.raises(pycurl.error):
+            s.get("http://upstream.local/")
+        assert pool.proxies[0].quarantined
+
+
+class BadGatewayHandler(EchoHostHandler):
+    def do_GET(self):
+        self.send_response(502)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_CONNECT = do_GET
+
+
+def test_proxy_pool_refusals():
+    proxy = ThreadingHTTPServer(("127.0.0.1", 0), BadGatewayHandler)
+    threading.Thread(target=proxy.serve_forever, daemon=True).start()
+
+    pool = ProxyPool([f"127.0.0.1:{proxy.server_address[1]}"], max_failures=4)
+    try:
+        with request_curl.Session(proxies=pool) as s:
+            for _ in range(2):
+                assert s.get("http://upstream.local/").status_code == 502
+            # CONNECT tunnels are refused with the same status
+            for _ in range(2):
+                with pytest.raises(pycurl.error):
+                    s.get("https://upstream.local/")
+        assert pool.proxies[0].successes == 0
+        assert pool.proxies[0].quarantined
+    finally:
+        proxy.shutdown()
+        proxy.server_close()